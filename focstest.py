@@ -1,101 +1,298 @@
 #!/usr/bin/env python3
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import importlib.util
+import json
 import logging
 import os
-from pkg_resources import get_distribution, DistributionNotFound
+import pickle
+import queue
 import re
 import subprocess
 import sys
 import tempfile
+import threading
 import urllib.parse
 
-from bs4 import BeautifulSoup
-import requests
-from termcolor import colored
-
 
 logger = logging.getLogger(name=__name__)  # create logger in order to change level later
 logger.setLevel(logging.DEBUG)
 logger.addHandler(logging.StreamHandler())
 
 
-# get version from setuptools installation
+# get version from package metadata
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # python < 3.8, fall back to the much slower setuptools
+    from pkg_resources import get_distribution, DistributionNotFound as PackageNotFoundError
+
+    def version(distribution_name):
+        return get_distribution(distribution_name).version
+
 try:
-    __version__ = get_distribution('focstest').version
-except DistributionNotFound:
+    __version__ = version('focstest')
+except PackageNotFoundError:
     # not installed
     # TODO: try git directly
     __version__ = 'unknown, try `git describe`'
 
 
+# ansi escape codes for colored output, only used when printing to a terminal
+if sys.stdout.isatty():
+    RED, GREEN, YELLOW, RESET = '\x1b[31m', '\x1b[32m', '\x1b[33m', '\x1b[0m'
+else:
+    RED = GREEN = YELLOW = RESET = ''
+
+
 # default url matching
 BASE_URL = "http://rpucella.net/courses/focs-fa20/homeworks/"  # website and path to look under
-OCAML_FILE_PATTERN = "homework(\d{1,2}).ml"  # pattern to pass the user-given ocaml file
+OCAML_FILE_PATTERN = r"homework(\d{1,2})\.ml\Z"  # pattern to pass the user-given ocaml file
 HTML_FILE_TEMPLATE = "homework{}.html"  # template to build the html filename given a homework number
 
-# selectors for parsing html
-CODE_BLOCK_SELECTOR = 'pre code'  # css selector to get code blocks
+# parsing html
+# lxml is faster if installed
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+CODE_BLOCK_TAGS = ['pre', 'code']  # only tags needed to find code blocks
+
+# bump whenever parsing changes, so tests cached from older pages get reparsed
+TESTS_CACHE_VERSION = 1
 
 # regex patterns for parsing text
-TEST_PATTERN = "^(.+;;)\n(.*)$"  # pattern to get input and output
+# pattern to get input and output
+TEST_PATTERN = r"^# ((?:(?!\n# ).)+?;;)[ \t]*(?:\n|\Z)(.*?)(?=^# |\Z)"
 OCAML_PATTERN = "^(.*)"  # pattern to grab output of lines
+PROMPT_PATTERN = r"(?:^|(?<=\n))# "  # pattern to find REPL prompts at the start of lines
+# pattern to find errors and their locations, possibly after a prompt
+ERROR_PATTERN = r"^(?:# )?((?:(?:File|Line|Characters)\b.*\n(?:[\d \t].*\n)*)?(?:Error|Exception):)"
+
+# printed by the REPL after running code to mark the end of its output
+EOT_TEMPLATE = '__FOCSTEST_EOT_{}__'
+EOT_PATTERN = r'__FOCSTEST_EOT_(\d+)__\r?\n'
 
 # compile regexes ahead of time
 OCAML_FILE_COMP = re.compile(OCAML_FILE_PATTERN)
 TEST_COMP = re.compile(TEST_PATTERN, re.MULTILINE + re.DOTALL)
 OCAML_COMP = re.compile(OCAML_PATTERN, re.MULTILINE + re.DOTALL)
+PROMPT_COMP = re.compile(PROMPT_PATTERN)
+ERROR_COMP = re.compile(ERROR_PATTERN, re.MULTILINE)
+EOT_COMP = re.compile(EOT_PATTERN)
+
+
+class OcamlError(Exception):
+    """Raised when the ocaml REPL doesn't respond as expected."""
 
 
 def get_blocks(html):
     """Parse code blocks from html.
 
-    :param html: html text
+    :param html: html text, or a file of html opened in binary mode
     :returns: list of strings of code blocks
+
+    >>> get_blocks('<p><code>x</code></p><pre><code># f 1;;\\n- : int = 1</code></pre>')
+    ['# f 1;;\\n- : int = 1']
     """
-    page = BeautifulSoup(html, 'html.parser')
-    code_blocks = page.select(CODE_BLOCK_SELECTOR)
+    from bs4 import BeautifulSoup, SoupStrainer  # slow to import, so only do it when needed
+    page = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer(CODE_BLOCK_TAGS))
+    code_blocks = [code for code in page.find_all('code')
+                   if code.parent is not None and code.parent.name == 'pre']
     if len(code_blocks) == 0:
-        logger.error('Code block selector {!r} returned no matches'.format(
-            CODE_BLOCK_SELECTOR))
+        logger.error('Found no <code> blocks inside <pre> tags')
     return [block.get_text() for block in code_blocks]
 
 
 def get_tests(text):
     """Parse Ocaml tests from text.
 
-    :returns: list of test tuples with format (input, expected, output)
+    :returns: list of test tuples with format (input, expected output)
+
+    >>> get_tests('# expt 2 3;;\\n- : int = 8\\n# expt 2 0;;\\n- : int = 1\\n')
+    [('expt 2 3;;', '- : int = 8'), ('expt 2 0;;', '- : int = 1')]
     """
-    def get_test(text):
-        return TEST_COMP.match(text)
-    test_strs = text.split('# ')[1:]
     tests = []
-    for test_str in test_strs:
-        test = get_test(test_str)
-        if test is None:
-            logger.error('Test/response pattern {!r} returned no matches from string {!r}'.format(TEST_PATTERN, test_str))
-        else:
-            tests.append((test.group(1).strip(), test.group(2).strip()))
+    end = 0
+    for test in TEST_COMP.finditer(text):
+        _log_unmatched_prompts(text[end:test.start()])
+        tests.append((test.group(1).strip(), test.group(2).strip()))
+        end = test.end()
+    _log_unmatched_prompts(text[end:])
     return tests
 
 
-def _run_ocaml_code(code):
-    """Run a line of ocaml with the REPL and capture the output.
+def _log_unmatched_prompts(text):
+    """Log an error for any prompts in text that weren't parsed as tests."""
+    prompt = PROMPT_COMP.search(text)
+    if prompt is not None:
+        logger.error('Test/response pattern {!r} returned no matches from string {!r}'.format(
+            TEST_PATTERN, text[prompt.start():]))
+
+
+def parse_error(output):
+    """Find an error in the output of the REPL.
+
+    :param output: output of the REPL
+    :returns: the error message, including its location if given, or None
+
+    >>> parse_error('val f : int -> int = <fun>\\n') is None
+    True
+    >>> print(parse_error('val f : int -> int = <fun>\\n'
+    ...                   'Line 1, characters 0-1:\\n1 | g 1;;\\n    ^\\n'
+    ...                   'Error: Unbound value g\\n'))
+    Line 1, characters 0-1:
+    1 | g 1;;
+        ^
+    Error: Unbound value g
+    <BLANKLINE>
+    >>> print(parse_error('# File "hw.ml", line 3, characters 4-5:\\nError: Syntax error\\n'))
+    File "hw.ml", line 3, characters 4-5:
+    Error: Syntax error
+    <BLANKLINE>
+    """
+    match = ERROR_COMP.search(output)
+    if match is None:
+        return None
+    return output[match.start(1):]  # leave out any prompt
 
-    :param code: string of code to run
-    :returns: tuple of strings with format (output, errors)
+
+def is_unimplemented(output):
+    """Check if the output of a test is from an unimplemented function.
+
+    >>> is_unimplemented('Exception: Failure "Not implemented".\\n')
+    True
+    >>> is_unimplemented('Exception: Failure "hd".\\n')
+    False
     """
-    with subprocess.Popen(['ocaml'],
-                          stdin=subprocess.PIPE,
-                          stdout=subprocess.PIPE,
-                          stderr=subprocess.PIPE,
-                          universal_newlines=True) as p:
+    return output.strip().lower() == 'exception: failure "not implemented".'
+
+
+class OcamlRepl:
+    """A long-running ocaml REPL that code can be sent to.
+
+    Starting the interpreter and loading a file costs much more than running a
+    typical test, so one process is started and reused for every test.
+
+    :param file: the path to a file to load in the interpreter at startup
+    :param timeout: seconds to wait for output before giving up on the process
+    """
+
+    def __init__(self, file: str = None, timeout: float = 5):
+        self.file = file
+        self.timeout = timeout
+        self._closed = False
+        self.load_error = None  # error from loading the file, if any
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:  # don't wait on a REPL that may be stuck, e.g. after Ctrl-C
+            self.terminate()
+
+    def _start(self):
+        self._process = subprocess.Popen(['ocaml'],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL,
+                                         bufsize=-1)
+        # read stdout on a separate thread so reads can time out
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_lines,
+                                  args=(self._process.stdout, self._lines),
+                                  daemon=True)
+        reader.start()
+        if self.file is not None:
+            # like the toplevel, keep any definitions made before an error
+            error = parse_error(self.run('#use "{}";;'.format(self.file)))
+            if error is not None:
+                self.load_error = 'Unable to load {!r}:\n{}'.format(self.file, error.rstrip('# \n'))
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        for line in iter(stream.readline, b''):
+            lines.put(line)
+        lines.put(None)  # signal that the process closed its output
+
+    def _kill(self):
+        self._process.kill()
+        self._process.wait()
+
+    def run(self, code: str):
+        """Run ocaml code with the REPL and capture the output.
+
+        :param code: string of code to run
+        :returns: string of the REPL's output, including prompts
+        """
+        return self.run_batch([code])[0]
+
+    def run_batch(self, codes):
+        """Run several pieces of ocaml code with the REPL at once.
+
+        Sending everything together saves a round trip to the REPL per piece.
+
+        :param codes: list of strings of code to run
+        :returns: list of strings of the REPL's output for each piece of code
+        :raises OcamlError: if the REPL times out or exits before finishing
+        """
+        script = ''.join('{}\nlet () = print_endline "{}";;\n'.format(code, EOT_TEMPLATE.format(i))
+                         for i, code in enumerate(codes))
+        last_marker = EOT_TEMPLATE.format(len(codes) - 1).encode()
+        if self._closed:
+            raise OcamlError('Ocaml process has been closed')
+        if self._process.poll() is not None:  # killed after an earlier failure
+            self._start()
+        try:
+            self._process.stdin.write(script.encode('utf-8'))
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            logger.warning('Ocaml process is no longer running')
+        lines = []
+        while True:
+            try:
+                line = self._lines.get(timeout=self.timeout)
+            except queue.Empty:
+                self._kill()
+                raise OcamlError('Ocaml process timed out: {}'.format(self._decode(lines)))
+            if line is None:
+                self._kill()
+                raise OcamlError('Ocaml process exited unexpectedly: {}'.format(
+                    self._decode(lines)))
+            lines.append(line)
+            if line.rstrip().endswith(last_marker):
+                break
+        # drop marker numbers and the trailing ''
+        outputs = EOT_COMP.split(self._decode(lines))[0::2][:-1]
+        if len(outputs) != len(codes):
+            raise OcamlError('Expected output for {} pieces of code, got {}'.format(
+                len(codes), len(outputs)))
+        return outputs
+
+    @staticmethod
+    def _decode(lines):
+        return b''.join(lines).decode('utf-8', 'replace')
+
+    def terminate(self):
+        """Kill the REPL right away, making any code still running fail."""
+        self._closed = True
+        self._kill()
+
+    def close(self):
+        """Quit the REPL, killing it if it doesn't exit in time."""
+        self._closed = True
+        if self._process.poll() is not None:
+            return
+        try:
+            self._process.stdin.write(b'#quit;;\n')
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
         try:
-            outs, errs = p.communicate(code, timeout=5)
+            self._process.wait(timeout=self.timeout)
         except subprocess.TimeoutExpired:
-            p.kill()
-            outs, errs = p.communicate()
-            logger.warning('Ocaml process timed out: {} {}'.format(outs, errs))
-    return (outs, errs)
+            self._process.kill()
+            self._process.wait()
 
 
 # text normalization techniques
@@ -103,9 +300,11 @@ def _run_ocaml_code(code):
 def equivalent(text):
     return text
 
+@lru_cache(maxsize=4096)
 def strip_whitespace(text):
     return text.strip()
 
+@lru_cache(maxsize=4096)
 def normalize_whitespace(text):
     """Replace instances of whitespace with ' '.
 
@@ -115,46 +314,139 @@ def normalize_whitespace(text):
     return ' '.join(text.split())
 
 
-def run_test(code: str, expected_out: str, file: str = None):
-    """Check the output of a line of code against an expected value.
+def check_output(code: str, outs: str, expected_out: str):
+    """Check the REPL output of a line of code against an expected value.
 
-    :param code: code to run
+    :param code: code that was run
+    :param outs: the output of the REPL, including prompts
     :param expected_out: the expected output of the code
-    :param file: the path to a file to load in the interpreter before running
-        the code
     :returns: tuple of a boolean indicating the results of the test and the
         output of the command
     """
 
-    steps = [
+    steps = (  # cheapest first
         equivalent,
         strip_whitespace,
         normalize_whitespace
-    ]
-    if file is not None:
-        command = '#use "{}";;\n'.format(file) + code
+    )
+    prompts = list(PROMPT_COMP.finditer(outs))
+    if len(prompts) != 2:
+        logger.warning("Unable to parse ocaml output, expected 2 prompts, got {}".format(
+            len(prompts)))
     else:
-        command = code
-    command += "\n#quit;;"
-    outs, errs = _run_ocaml_code(command)
-    matches = outs.split('# ')[1:]  # TODO: check if this should change based on the presence of a file
-    if len(matches) != 3 and file is not None:
-        logger.warning("Unable to parse ocaml output, expected 2 matches, got {}".format(len(matches)))
-    elif len(matches) != 2 and file is None:
-        logger.error("Unable to parse ocaml output, expected 1 match, got {} ".format(len(matches)))
-    else:
-        # compare strings
-        output = matches[-2]  # don't use empty final match from #quit;;
+        # compare the text between the code's prompt and the end marker's
+        output = outs[prompts[0].end():prompts[1].start()]
         for step in steps:
-            function = code.split()[0]  # grab the first word of the command (probably the function name)
-            method = step.__name__
-            result = step(output) == step(expected_out)
-            if result is True:
+            if step(output) == step(expected_out):
+                result = True
+                method = step.__name__
+                # grab the first word of the command (probably the function name)
+                function = code.split(None, 1)[0]
                 logger.debug('Test {!r} passed with method {!r}'.format(function, method))
                 break
+        else:
+            result = False
+            method = steps[-1].__name__
         return (result, output, method)
 
 
+def run_test(code: str, expected_out: str, repl: OcamlRepl):
+    """Check the output of a line of code against an expected value.
+
+    :param code: code to run
+    :param expected_out: the expected output of the code
+    :param repl: the REPL to run the code in
+    :returns: tuple of a boolean indicating the results of the test and the
+        output of the command
+    """
+    try:
+        outs = repl.run(code)
+    except OcamlError as e:
+        logger.warning(e)
+        return None
+    return check_output(code, outs, expected_out)
+
+
+def run_suite(suite, repl: OcamlRepl):
+    """Run a suite of tests, sending them all to the REPL at once.
+
+    :param suite: list of tuples with format (code, expected output)
+    :param repl: the REPL to run the tests in
+    :returns: list of results from `run_test` for each test
+    """
+    try:
+        outputs = repl.run_batch([code for code, expected_out in suite])
+    except OcamlError as e:
+        # fall back to running tests one at a time so one bad test (like an
+        # infinite loop) doesn't take the rest of the suite down with it
+        logger.warning('{}\nRetrying suite one test at a time'.format(e))
+        return [run_test(code, expected_out, repl) for code, expected_out in suite]
+    return [check_output(code, outs, expected_out)
+            for (code, expected_out), outs in zip(suite, outputs)]
+
+
+def run_suites(suites, file: str = None, max_workers: int = None):
+    """Run test suites in parallel, each in a fresh REPL.
+
+    Tests spend most of their time waiting on ocaml, so threads are enough to
+    keep several REPLs busy at once. Every suite gets its own REPL with only
+    the file loaded, so what a suite sees doesn't depend on how many run at
+    once.
+
+    :param suites: list of tuples with format (index, suite)
+    :param file: the path to a file to load in each REPL
+    :param max_workers: the most REPLs to run at once, defaults to the number
+        of CPUs
+    :returns: iterator of results from `run_suite` for each suite, in order,
+        with None for each test of a suite whose REPL couldn't be started
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    stopping = threading.Event()
+    lock = threading.Lock()  # guards repls and load_error_logged
+    repls = set()
+    load_error_logged = False
+
+    def run(suite):
+        nonlocal load_error_logged
+        if stopping.is_set():  # cancelled before it could start
+            return [None] * len(suite)
+        try:
+            repl = OcamlRepl(file)
+        except OcamlError as e:
+            logger.warning(e)
+            return [None] * len(suite)
+        with lock:
+            repls.add(repl)
+            if stopping.is_set():  # started after the run was stopped
+                repl.terminate()
+            if repl.load_error is not None and not load_error_logged:
+                logger.warning(repl.load_error)
+                load_error_logged = True
+        try:
+            return run_suite(suite, repl)
+        finally:
+            with lock:
+                repls.discard(repl)
+            repl.close()
+
+    executor = ThreadPoolExecutor(max(1, min(len(suites), max_workers)))
+    futures = [executor.submit(run, suite) for j, suite in suites]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        if not all(future.done() for future in futures):
+            # stopped early (e.g. on Ctrl-C), so don't wait for queued suites
+            stopping.set()
+            for future in futures:
+                future.cancel()
+            with lock:
+                for repl in repls:
+                    repl.terminate()
+        executor.shutdown(wait=False)
+
+
 def get_test_str(test_input: str, test_output: str, expected: str,
                  use_color=True, indent='  '):
     """Create an explanatory str about a test for printing."""
@@ -168,6 +460,7 @@ def get_test_str(test_input: str, test_output: str, expected: str,
     return '\n'.join(lines)
 
 
+@lru_cache(maxsize=64)
 def infer_url(filepath):
     """Infer a url based on a filename.
 
@@ -178,6 +471,9 @@ def infer_url(filepath):
     >>> infer_url('foo/bar.ml')
     False
 
+    >>> infer_url('foo/homework1.mli')
+    False
+
     >>> infer_url('foo/bar/homework1.ml')
     'http://rpucella.net/courses/focs-fa20/homeworks/homework1.html'
     """
@@ -210,6 +506,8 @@ def main():
     test_selection.add_argument('-s', '--skip-suites', metavar='N', type=int, nargs='*',
                                 help='test suites to skip, indexed from 1')
     args = parser.parse_args()
+    use_suites = frozenset(args.use_suites or ())
+    skip_suites = frozenset(args.skip_suites or ())
 
     # check environment var for logging level
     log_level = os.getenv('LOG_LEVEL')
@@ -237,40 +535,88 @@ def main():
     # get and cache webpage
     temp_dir = tempfile.gettempdir()  # most likely /tmp/ on Linux
     CACHE_DIR = os.path.join(temp_dir, 'focstest-cache')
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
-        logger.info('Created cache directory at {!r}'.format(CACHE_DIR))
+    os.makedirs(CACHE_DIR, exist_ok=True)
     page_name = os.path.basename(urllib.parse.urlparse(URL).path)  # get page name from url
     html_filepath = os.path.join(CACHE_DIR, page_name)  # local filepath
+    tests_filepath = html_filepath + '.tests.pkl'  # parsed tests from the page
+    headers_filepath = html_filepath + '.headers.json'  # headers to check if the page changed
+
+    try:
+        html_mtime = os.path.getmtime(html_filepath)
+    except OSError:  # page isn't cached yet
+        html_mtime = None
 
     # get webpage if cached version doesn't already exist
-    if not os.path.isfile(html_filepath) or args.update_cache:
-        response = requests.get(URL)
-        if response.status_code != 200:  # break if webpage can't be fetched
+    page_fetched = False
+    if html_mtime is None or args.update_cache:
+        request_headers = {}
+        if html_mtime is not None:  # only download the page again if it changed
+            try:
+                with open(headers_filepath, 'r') as headercache:
+                    cached_headers = json.load(headercache)
+            except (OSError, ValueError) as e:
+                logger.debug("Unable to load cached headers from {!r}: {}".format(
+                    headers_filepath, e))
+                cached_headers = {}
+            if 'ETag' in cached_headers:
+                request_headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                request_headers['If-Modified-Since'] = cached_headers['Last-Modified']
+        import requests  # slow to import, so only do it when needed
+        with requests.Session() as session:
+            response = session.get(URL, headers=request_headers)
+        if response.status_code == 304:
+            logger.debug("Cached version of page at {!r} is up to date".format(html_filepath))
+        elif response.status_code != 200:  # break if webpage can't be fetched
             logger.critical("Unable to fetch url {}: Status {}: {}".format(
                 URL,
                 response.status_code,
                 response.reason))
             sys.exit(1)
-        # write to file and continue
-        html = response.text
-        with open(html_filepath, 'w') as htmlcache:
-            htmlcache.write(html)
-            logger.debug("Saved {!r} to cache at {!r}".format(URL, html_filepath))
+        else:
+            # write to file and continue
+            page_fetched = True
+            with open(html_filepath, 'wb') as htmlcache:
+                htmlcache.write(response.content)
+                logger.debug("Saved {!r} to cache at {!r}".format(URL, html_filepath))
+            with open(headers_filepath, 'w') as headercache:
+                json.dump({name: response.headers[name] for name in ('ETag', 'Last-Modified')
+                           if name in response.headers}, headercache)
     else:
         logger.debug("Using cached version of page at {!r}".format(html_filepath))
-        with open(html_filepath, 'r') as htmlcache:
-            html = htmlcache.read()
-
-    # parse for code blocks
-    # TODO: get titles/descriptions from code blocks
-    blocks = get_blocks(html)
-    # parse code blocks for tests
-    test_suites = list(enumerate(filter(None, (get_tests(b) for b in blocks)), 1))  # list of suites and indices (starting at 1) (skipping empty suites)
-    num_tests = sum([len(suite) for j, suite in test_suites])
+
+    # use tests parsed by a previous run if the page hasn't changed since
+    test_suites = None
+    if not page_fetched:
+        try:
+            with open(tests_filepath, 'rb') as testcache:
+                if os.fstat(testcache.fileno()).st_mtime >= html_mtime:
+                    cache_key, test_suites, num_tests = pickle.load(testcache)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Unable to load cached tests from {!r}: {}".format(tests_filepath, e))
+        if test_suites is not None:
+            if cache_key != (TESTS_CACHE_VERSION, __version__):  # parsing may have changed
+                test_suites = None
+            else:
+                logger.debug("Using cached tests at {!r}".format(tests_filepath))
+
+    if test_suites is None:
+        # parse for code blocks
+        # TODO: get titles/descriptions from code blocks
+        with open(html_filepath, 'rb') as htmlcache:
+            blocks = get_blocks(htmlcache)
+        # parse code blocks for tests
+        # list of suites and indices (starting at 1) (skipping empty suites)
+        test_suites = list(enumerate(filter(None, map(get_tests, blocks)), 1))
+        num_tests = sum(len(suite) for j, suite in test_suites)
+        with open(tests_filepath, 'wb') as testcache:
+            pickle.dump(((TESTS_CACHE_VERSION, __version__), test_suites, num_tests), testcache,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            logger.debug("Saved tests to cache at {!r}".format(tests_filepath))
     logger.info("Found {} test suites and {} tests total".format(
         len(test_suites), num_tests))
-    # TODO: save tests to file
 
     # run tests
     if not os.path.exists(FILE):
@@ -281,59 +627,59 @@ def main():
 
     # select test suites based on args
     # i is indexed from 0, j is indexed from 1
-    if args.use_suites:
-        skipped_suites = [suite for j, suite in test_suites if j not in args.use_suites]
+    if use_suites:
+        skipped_suites = [suite for j, suite in test_suites if j not in use_suites]
         for suite in skipped_suites:
             num_skipped += len(suite)
         test_suites = [test_suites[j-1] for j in args.use_suites]
-    elif args.skip_suites:
-        skipped_suites = [test_suites[j-1][1] for j in args.skip_suites]
+    elif skip_suites:
+        skipped_suites = [test_suites[j-1][1] for j in skip_suites]
         for suite in skipped_suites:
             num_skipped += len(suite)
-        test_suites = [(j, suite) for j, suite in test_suites if j not in args.skip_suites]
+        test_suites = [(j, suite) for j, suite in test_suites if j not in skip_suites]
 
     print('Starting tests')
-    for j, suite in test_suites:
+    for (j, suite), results in zip(test_suites, run_suites(test_suites, FILE)):
         if args.verbose:
             print('Testing suite {}'.format(j))
-        for k, (test, expected_output) in enumerate(suite):
-            res = run_test(test, expected_output, file=FILE)
+        for k, ((test, expected_output), res) in enumerate(zip(suite, results)):
             header_temp = ' test {} of {} in suite {}'.format(k+1, len(suite), j)
             if res is None:  # skip unparsable texts
-                print(colored('Skipped'+header_temp+': Unable to parse output','yellow'))
+                num_skipped += 1
+                print(YELLOW+'Skipped'+header_temp+': Unable to parse output'+RESET)
                 continue
             else:
                 result, output, method = res
             test_str = get_test_str(test, output, expected_output)
             function = test.split()[0]
             if result is False:
-                if output.strip().lower() == 'exception: failure "not implemented".':
+                if is_unimplemented(output):
                     if args.verbose:
-                        print(colored('Unimplemented'+header_temp, 'yellow'))
+                        print(YELLOW+'Unimplemented'+header_temp+RESET)
                         print(test_str)
                     num_skipped += len(suite) - (k + 1)
-                    print(colored('Skipped unimplemented suite {} {!r}'.format(j, function), 'yellow'))
+                    print(YELLOW+'Skipped unimplemented suite {} {!r}'.format(j, function)+RESET)
                     break
                 num_failed += 1
-                print(colored('Failed'+header_temp, 'red'))
+                print(RED+'Failed'+header_temp+RESET)
                 print(test_str)
             elif args.verbose:
                 header = 'Passed'+header_temp
                 if method not in ['equivalent', 'strip_whitespace']:
                     header += ' w/ method '+method
-                print(colored(header, 'green'))
+                print(GREEN+header+RESET)
                 print(test_str)
         if args.verbose:
             print('-'*80)
     print('Finished testing')
     fail_summary = '{} of {} tests failed'.format(num_failed, num_tests - num_skipped)
     if num_failed > 0:
-        print(colored(fail_summary, 'red'))
+        print(RED+fail_summary+RESET)
     else:
-        print(colored(fail_summary, 'green'))
+        print(GREEN+fail_summary+RESET)
     skip_summary = '{} tests skipped'.format(num_skipped)
     if num_skipped > 0:
-        print(colored(skip_summary, 'yellow'))
+        print(YELLOW+skip_summary+RESET)
     else:
         print(skip_summary)
 
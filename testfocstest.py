@@ -1,9 +1,12 @@
 """Tests for focstest.py, from the creators of focstest.py"""
+import threading
 import unittest
 import doctest
+from unittest import mock
 
 import focstest
-from focstest import equivalent, strip_whitespace, normalize_whitespace
+from focstest import (equivalent, strip_whitespace, normalize_whitespace, get_tests, check_output,
+                      run_suites, OcamlError)
 
 
 def load_tests(loader, tests, ignore):
@@ -28,5 +31,120 @@ class TestTextNormalization(unittest.TestCase):
                 normalize_whitespace(generated))
 
 
+class TestGetTests(unittest.TestCase):
+    """Test parsing tests out of code blocks."""
+
+    def test_get_tests(self):
+        text = ('# let f x =\n    x + 1;;\nval f : int -> int = <fun>\n'
+                '# f 1;;\n- : int = 2\n'
+                '# print_string "";;\n'
+                '# f 2;;\n- : int = 3')
+        self.assertEqual(get_tests(text), [
+            ('let f x =\n    x + 1;;', 'val f : int -> int = <fun>'),
+            ('f 1;;', '- : int = 2'),
+            ('print_string "";;', ''),
+            ('f 2;;', '- : int = 3'),
+        ])
+
+    def test_prompt_without_input(self):
+        text = '# some comment\n# f 1;;\n- : int = 1'
+        with self.assertLogs(focstest.logger, 'ERROR'):
+            tests = get_tests(text)
+        self.assertEqual(tests, [('f 1;;', '- : int = 1')])
+
+
+class TestCheckOutput(unittest.TestCase):
+    """Test comparing REPL output with expected output."""
+
+    def test_prompt_in_output(self):
+        outs = '# - : string = "a # b"\n# '
+        self.assertEqual(
+            check_output('"a # b";;', outs, '- : string = "a # b"'),
+            (True, '- : string = "a # b"\n', 'strip_whitespace'))
+
+
+class StubRepl:
+    """Stands in for OcamlRepl, answering each piece of code with itself."""
+
+    instances = []
+    started = None  # set once a 'start;;' or 'block;;' test runs
+
+    def __init__(self, file=None, timeout=5):
+        if file == 'broken.ml':
+            raise OcamlError('Ocaml process exited unexpectedly: ')
+        self.load_error = None
+        self.terminated = False
+        self.stopped = threading.Event()
+        self.closed = threading.Event()
+        self.instances.append(self)
+
+    def run(self, code):
+        return self.run_batch([code])[0]
+
+    def run_batch(self, codes):
+        if self.stopped.is_set():
+            raise OcamlError('Ocaml process has been closed')
+        outputs = []
+        for code in codes:
+            if code in ('start;;', 'block;;'):
+                self.started.set()
+            if code in ('wait;;', 'fail;;'):  # wait for another suite to start
+                self.started.wait(5)
+            if code == 'fail;;':
+                raise RuntimeError('stub failure')
+            if code == 'block;;':  # run until terminated
+                self.stopped.wait(5)
+                raise OcamlError('Ocaml process exited unexpectedly: ')
+            outputs.append('# {}\n# '.format(code))
+        return outputs
+
+    def terminate(self):
+        self.terminated = True
+        self.stopped.set()
+
+    def close(self):
+        self.stopped.set()
+        self.closed.set()
+
+
+class TestRunSuites(unittest.TestCase):
+    """Test running suites in parallel, with a stub in place of ocaml."""
+
+    def setUp(self):
+        StubRepl.instances = []
+        StubRepl.started = threading.Event()
+        patcher = mock.patch.object(focstest, 'OcamlRepl', StubRepl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_in_order(self):
+        # the first suite only finishes after the second one starts
+        suites = [(1, [('wait;;', 'wait;;')]), (2, [('start;;', 'start;;'), ('1;;', '2')])]
+        self.assertEqual(list(run_suites(suites, 'hw.ml', max_workers=2)), [
+            [(True, 'wait;;\n', 'strip_whitespace')],
+            [(True, 'start;;\n', 'strip_whitespace'), (False, '1;;\n', 'normalize_whitespace')],
+        ])
+        self.assertEqual(len(StubRepl.instances), 2)  # a fresh REPL for each suite
+        for repl in StubRepl.instances:
+            self.assertTrue(repl.closed.is_set())
+            self.assertFalse(repl.terminated)
+
+    def test_repl_fails_to_start(self):
+        suites = [(1, [('1;;', '1'), ('2;;', '2')])]
+        with self.assertLogs(focstest.logger, 'WARNING'):
+            results = list(run_suites(suites, 'broken.ml'))
+        self.assertEqual(results, [[None, None]])
+
+    def test_failure_stops_other_suites(self):
+        suites = [(1, [('fail;;', '')]), (2, [('block;;', '')])]
+        with self.assertLogs(focstest.logger, 'WARNING'):
+            with self.assertRaises(RuntimeError):
+                list(run_suites(suites, 'hw.ml', max_workers=2))
+            self.assertEqual(len(StubRepl.instances), 2)
+            for repl in StubRepl.instances:  # wait for the workers to clean up
+                self.assertTrue(repl.closed.wait(5))
+        self.assertTrue(StubRepl.instances[1].terminated)
+
+
 if __name__ == '__main__':
     unittest.main()